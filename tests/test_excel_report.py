@@ -0,0 +1,40 @@
+import sys
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import b
+
+CODES = ["L1", "ZERO", "FLAT", "ONE"]
+
+
+def portfolio_bytes():
+    months = [f"2023-{m:02d}" for m in range(1, 13)]
+    rows = [
+        ["L1", "Active", 1000] + [0, 30, 60, 30, 0, 0, 90, 120, 30, 0, 0, 15],
+        ["ZERO", "Never late", 2000] + [0] * 12,
+        ["FLAT", "Constant", 3000] + [30] * 12,
+        ["ONE", "Single month", 4000] + [45] + [np.nan] * 11,
+    ]
+    buf = BytesIO()
+    pd.DataFrame(rows, columns=["Code", "Type", "Balance"] + months).to_excel(buf, index=False, engine="xlsxwriter")
+    return buf.getvalue()
+
+
+def excel_report(file_bytes):
+    _, _, months, dpd_matrix = b.load_portfolio(file_bytes)
+    return b.build_excel_report(dpd_matrix, b.calc_row_stats(dpd_matrix), b.account_index(file_bytes), months)
+
+
+def test_excel_report_exports_flat_and_single_month_accounts():
+    sheets = pd.read_excel(BytesIO(excel_report(portfolio_bytes())), sheet_name=None, engine="calamine")
+    assert {f"METRICS_{code}" for code in CODES} <= set(sheets)
+    # NaN metrics come back as blank cells, not #NUM! errors
+    for code in ("ZERO", "FLAT"):
+        metrics = sheets[f"METRICS_{code}"].set_index("Metric")["Value"]
+        assert pd.isna(metrics["Autocorr Lag 1"])
+    single = sheets["METRICS_ONE"].set_index("Metric")["Value"]
+    assert pd.isna(single["Std Deviation"]) and pd.isna(single["Skewness"])
@@ -0,0 +1,114 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import b
+
+
+def sample_matrix():
+    """Random DPD rows with #N/A gaps and fractional values, plus the edge rows the metrics special-case"""
+    rng = np.random.default_rng(7)
+    dpd = rng.choice([0, 0, 0, 15, 30, 45, 60, 90, 120], size=(300, 24)).astype(float)
+    dpd[100:200] += rng.integers(0, 10, size=(100, 24)) / 10
+    dpd[rng.random(dpd.shape) < 0.25] = np.nan
+    dpd[0] = np.nan
+    dpd[1] = np.nan
+    dpd[1, 7] = 45.5
+    dpd[2] = 0
+    dpd[3] = 30
+    dpd[4] = np.nan
+    dpd[4, 3:5] = [60, 90]
+    return dpd
+
+
+def valid_rows(dpd):
+    """Each row's dropna'd values, as the per-series formulas saw them"""
+    return [(i, row[~np.isnan(row)]) for i, row in enumerate(dpd)]
+
+
+def test_row_moments_match_per_series_formulas():
+    dpd = sample_matrix()
+    stats = b.calc_row_stats(dpd)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for i, x in valid_rows(dpd):
+            assert stats["count"][i] == len(x)
+            if len(x) == 0:
+                continue
+            # Exact: Cumulative DPD is int()-truncated and Mean DPD rounded, so the last bit matters
+            assert stats["sum"][i] == x.sum()
+            assert stats["mean"][i] == np.mean(x)
+            np.testing.assert_allclose(stats["std"][i], np.std(x, ddof=1), rtol=1e-12)
+            np.testing.assert_allclose(stats["std_pop"][i], np.std(x), rtol=1e-12)
+            s = np.std(x, ddof=1)
+            skew = np.mean(((x - x.mean()) / s) ** 3) if s != 0 else 0
+            kurt = np.mean(((x - x.mean()) / s) ** 4) if s != 0 else 0
+            np.testing.assert_allclose([stats["skew"][i], stats["kurt"][i]], [skew, kurt], rtol=1e-9, atol=1e-12)
+            t = np.arange(len(x))
+            den = np.sum((t - t.mean()) ** 2)
+            slope = np.sum((t - t.mean()) * (x - x.mean())) / den if den != 0 else 0
+            np.testing.assert_allclose(stats["slope"][i], slope, rtol=1e-9, atol=1e-12)
+            assert stats["delinquent"][i] == (x > 0).sum()
+            assert stats["severe"][i] == (x >= 90).sum()
+
+
+def test_row_order_stats_match_numpy():
+    dpd = sample_matrix()
+    stats = b.calc_row_stats(dpd)
+    for i, x in valid_rows(dpd):
+        if len(x) == 0:
+            continue
+        assert stats["min"][i] == np.min(x)
+        assert stats["median"][i] == np.median(x)
+        assert stats["max"][i] == np.max(x)
+
+
+def test_calc_mode_matches_series_mode():
+    cases = [x for _, x in valid_rows(sample_matrix()) if len(x)]
+    cases += [np.array([30.0, 0.0, 30.0, 0.0]), np.array([12000.0, 12000.0, 5.0]), np.array([-5.0, -5.0, 10.0]), np.array([7.5])]
+    for x in cases:
+        assert b.calc_mode(x) == pd.Series(x).mode().iloc[0]
+    assert b.calc_mode(np.array([])) == 0
+
+
+def test_lag1_autocorrelation_matches_corrcoef():
+    dpd = sample_matrix()
+    stats = b.calc_row_stats(dpd)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for i, x in valid_rows(dpd):
+            if len(x) == 0:
+                continue
+            # Single-point rows report 0; flat and two-point rows are NaN, as np.corrcoef gives
+            expected = np.corrcoef(x[:-1], x[1:])[0, 1] if len(x) > 1 else 0
+            np.testing.assert_allclose(stats["lag1"][i], expected, rtol=1e-9, atol=1e-12, equal_nan=True)
+
+
+def baseline_monthly_avg(dpd, months):
+    """The original dict-based grouping: calendar month from 'YYYY-MM', else position within the series"""
+    month_data = {}
+    for i, m in enumerate(months):
+        month_str = str(m)
+        month_num = int(month_str.split('-')[1]) if '-' in month_str and month_str.split('-')[1].isdigit() else (i % 12) + 1
+        month_data.setdefault(month_num, []).append(dpd[i])
+    return {k: np.mean(v) for k, v in month_data.items()}
+
+
+def test_seasonality_rows_match_dict_based_monthly_averages():
+    dpd = sample_matrix()
+    stats = b.calc_row_stats(dpd)
+    dated = [f"{2021 + m // 12}-{m % 12 + 1:02d}" for m in range(24)]
+    for labels in (dated, [f"M{m}" for m in range(24)]):
+        month_nums = b.month_numbers(pd.Index(labels))
+        for i, x in valid_rows(dpd):
+            if len(x) == 0:
+                continue
+            avg = baseline_monthly_avg(x, np.array(labels)[~np.isnan(dpd[i])])
+            overall = np.mean(list(avg.values()))
+            idx = {k: (v / overall * 100) if overall > 0 else 100 for k, v in avg.items()}
+            strength = np.std(list(avg.values())) / overall if len(avg) >= 2 and overall > 0 else 0
+            peak, trough = max(idx, key=idx.get), min(idx, key=idx.get)
+            expected = [round(strength, 3), peak, trough, round(idx[peak], 1), round(idx[trough], 1), round(idx[peak] - idx[trough], 1)]
+            rows = b.account_metric_rows(dpd[i], stats, i, month_nums)
+            assert [row[1] for row in rows[-6:]] == expected